@@ -0,0 +1,22 @@
+# cython: language_level=3
+# Optional compiled helper for modify.py. Build in place with:
+#   pip install cython && cythonize -i _modify_fast.pyx
+# modify.py falls back to pure Python when the extension is absent.
+
+from cpython.unicode cimport PyUnicode_GET_LENGTH
+
+
+def first_affected_run(list texts, Py_ssize_t start):
+    """Index of the first run whose span extends past `start`, and the
+    offset at which that run begins.
+
+    One C loop over the run texts with no per-iteration Python dispatch;
+    replaces the cumulative-offset list + bisect done in Python.
+    """
+    cdef Py_ssize_t pos = 0, nxt, i, n = len(texts)
+    for i in range(n):
+        nxt = pos + PyUnicode_GET_LENGTH(<str> texts[i])
+        if nxt > start:
+            return i, pos
+        pos = nxt
+    return n, pos
@@ -0,0 +1,387 @@
+# Patch a DOCX from a JSON edit list keyed by stable segment ids.
+#
+# Usage: python modify.py [patch.json]
+#   Always writes the segment id map for the source document; with a patch
+#   file, also applies the edits and saves a patched copy.
+#
+# A patch is a JSON list of edits:
+#   {"id": "p-0003", "op": "replace_text", "old_excerpt": "...", "new_text": "..."}
+#   {"id": "p-0003", "op": "insert_after", "new_text": "..."}
+
+import json
+import mmap
+import re
+import sys
+from bisect import bisect_right
+from copy import deepcopy
+from dataclasses import dataclass, fields
+from pathlib import Path
+from zipfile import ZipFile
+
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; str.find covers everything
+    njit = None
+
+try:
+    # compiled run-boundary search; build with `cythonize -i _modify_fast.pyx`
+    from _modify_fast import first_affected_run
+except ImportError:
+    first_affected_run = None
+
+DOC_PATH = Path("data/test.docx")
+OUT_PATCHED = Path("data/test-patched.docx")
+OUT_MAP_JSON = Path("data/test-segments.json")
+
+# characters of context captured either side of a segment for the id map
+WINDOW = 80
+
+
+@dataclass(slots=True)
+class Segment:
+    id: str
+    kind: str
+    para_idx: int
+    text: str
+    context_left: str
+    context_right: str
+
+
+_SEGMENT_FIELDS = tuple(f.name for f in fields(Segment))
+
+
+def make_segments(doc):
+    """One Segment per paragraph, with context windows so whoever writes the
+    patch can locate each segment without reading the whole document.
+    Paragraphs no longer than the window get None contexts (null in the
+    emitted map) — they would just duplicate `text` verbatim, doubling the
+    map's size for short-paragraph documents.
+
+    Returns (segments, paras, seg_by_id). doc.paragraphs rebuilds its list
+    from the XML on every access, so the paragraph list and the id lookup
+    are built here in one pass and reused by the patch loop.
+    """
+    paras = list(doc.paragraphs)
+    window = WINDOW
+    segments = [
+        Segment(
+            f"p-{i + 1:04d}",
+            "paragraph",
+            i,
+            t,
+            t[:window] if len(t) > window else None,
+            t[-window:] if len(t) > window else None,
+        )
+        for i, t in enumerate(p.text or "" for p in paras)
+    ]
+    seg_by_id = {s.id: s for s in segments}
+    return segments, paras, seg_by_id
+
+
+# below this length C-level str.find wins outright; JIT warmup and the
+# bytes copy only pay for themselves on long paragraphs
+_JIT_MIN_CHARS = 4096
+
+if njit is not None:
+    import numpy as np
+
+    @njit(cache=True)
+    def _bmh_find(buf, needle):
+        """Boyer-Moore-Horspool over uint8 buffers; returns -1 if absent."""
+        n = buf.size
+        m = needle.size
+        if m == 0:
+            return 0
+        if m > n:
+            return -1
+        skip = np.full(256, m, dtype=np.int64)
+        for i in range(m - 1):
+            skip[needle[i]] = m - 1 - i
+        i = m - 1
+        while i < n:
+            j = m - 1
+            k = i
+            while j >= 0 and buf[k] == needle[j]:
+                j -= 1
+                k -= 1
+            if j < 0:
+                return k + 1
+            i += skip[buf[i]]
+        return -1
+
+
+def _find_excerpt(concatenated, old_excerpt):
+    """Offset of old_excerpt in concatenated, or -1.
+
+    Long ASCII paragraphs go through the compiled Horspool scan (ASCII only,
+    so byte offsets equal character offsets); everything else uses str.find.
+    """
+    if (
+        njit is not None
+        and len(concatenated) >= _JIT_MIN_CHARS
+        and concatenated.isascii()
+        and old_excerpt.isascii()
+    ):
+        buf = np.frombuffer(concatenated.encode("ascii"), dtype=np.uint8)
+        needle = np.frombuffer(old_excerpt.encode("ascii"), dtype=np.uint8)
+        return int(_bmh_find(buf, needle))
+    return concatenated.find(old_excerpt)
+
+
+def _remove_all_runs(paragraph):
+    # one C-level traversal instead of an lxml remove() per run, each of
+    # which rescans the parent's children
+    etree.strip_elements(paragraph._element, qn("w:r"), with_tail=False)
+
+
+def _set_run_text(run, text):
+    """Assign run text at the lxml level, keeping <w:rPr> intact.
+
+    Bypasses python-docx's Run.text setter, which rebuilds the run's content
+    children through Python-level element wrappers.
+    """
+    r_el = run._element
+    etree.strip_elements(
+        r_el, qn("w:t"), qn("w:tab"), qn("w:br"), qn("w:cr"), with_tail=False
+    )
+    t = OxmlElement("w:t")
+    t.text = text
+    t.set(qn("xml:space"), "preserve")
+    r_el.append(t)
+
+
+def _replace_span(paragraph, start, end, new_text):
+    """Splice new_text over [start, end) of the paragraph's text.
+
+    Only runs overlapping the span are touched: the first affected run
+    takes the replacement (plus any text of its own outside the span),
+    fully covered runs are removed, and the boundary runs keep their
+    leading/trailing text and styling. Everything else is left alone.
+    """
+    runs = paragraph.runs
+    texts = [r.text for r in runs]
+
+    if start == 0 and end == sum(map(len, texts)):
+        # whole-paragraph replacement: a single-run rebuild is cheaper
+        src = runs[0] if runs else None
+        _remove_all_runs(paragraph)
+        new_run = paragraph.add_run(new_text)
+        if src is not None:
+            new_run.bold = src.bold
+            new_run.italic = src.italic
+            new_run.underline = src.underline
+        return
+
+    # first run whose end lies past the match start; runs before it are
+    # untouched and skipped entirely
+    if first_affected_run is not None:
+        first_run_idx, pos = first_affected_run(texts, start)
+    else:
+        run_ends = []
+        pos = 0
+        for t in texts:
+            pos += len(t)
+            run_ends.append(pos)
+        first_run_idx = bisect_right(run_ends, start)
+        pos = run_ends[first_run_idx - 1] if first_run_idx else 0
+    inserted = False
+    for r, t in zip(runs[first_run_idx:], texts[first_run_idx:]):
+        nxt = pos + len(t)
+        if pos >= end:
+            break
+        head = t[: start - pos] if start > pos else ""
+        tail = t[end - pos :] if end < nxt else ""
+        if not inserted:
+            patched = head + new_text + tail
+            inserted = True
+        else:
+            patched = head + tail
+        if patched:
+            _set_run_text(r, patched)
+        else:
+            r_el = r._element
+            r_el.getparent().remove(r_el)
+        pos = nxt
+
+
+def replace_first_occurrence_in_runs(paragraph, old_excerpt, new_text, concatenated=None):
+    """Replace the first occurrence of old_excerpt in the paragraph's text.
+
+    `concatenated` lets callers pass the paragraph text they already hold
+    (p.text walks every run element each call) — it must match the current
+    run contents, so only pass it for a paragraph's first edit.
+    """
+    if concatenated is None:
+        concatenated = "".join(r.text for r in paragraph.runs)
+    start = _find_excerpt(concatenated, old_excerpt)
+    if start == -1:
+        return False
+    _replace_span(paragraph, start, start + len(old_excerpt), new_text)
+    return True
+
+
+def _apply_replacement_batch(paragraph, seg, batch_edits):
+    """Apply several replace_text edits to one paragraph in a single scan.
+
+    One compiled alternation of all the excerpts finds every span in a
+    single C-level pass over the text; each edit claims one hit of its
+    excerpt, in patch order, and the spans are then spliced right-to-left
+    so earlier offsets stay valid.
+    """
+    concatenated = seg.text
+    by_excerpt = {}
+    for e in batch_edits:
+        by_excerpt.setdefault(e["old_excerpt"], []).append(e)
+    # longest alternative first so a short excerpt can't shadow a longer one
+    pat = re.compile(
+        "|".join(map(re.escape, sorted(by_excerpt, key=len, reverse=True)))
+    )
+    hits = []
+    for m in pat.finditer(concatenated):
+        queue = by_excerpt[m.group(0)]
+        if not queue:
+            continue
+        e = queue.pop(0)
+        hits.append((m.start(), m.end(), e["new_text"]))
+    for start, end, new_text in reversed(hits):
+        _replace_span(paragraph, start, end, new_text)
+    missing = sum(len(q) for q in by_excerpt.values())
+    if missing:
+        print(f"{missing} excerpt(s) not found in {seg.id}", file=sys.stderr)
+    return len(hits)
+
+
+def insert_paragraph_after(paragraph, text):
+    """Insert a new paragraph directly after `paragraph`, echoing its style.
+
+    Formatting is carried over by deep-copying the source <w:pPr> and the
+    first run's <w:rPr> — one C-level clone each, instead of round-tripping
+    through python-docx's style/bold/italic/underline property setters.
+    """
+    src_p = paragraph._p
+    new_p = OxmlElement("w:p")
+    src_ppr = src_p.find(qn("w:pPr"))
+    if src_ppr is not None:
+        new_p.append(deepcopy(src_ppr))
+    new_r = OxmlElement("w:r")
+    src_r = src_p.find(qn("w:r"))
+    if src_r is not None:
+        src_rpr = src_r.find(qn("w:rPr"))
+        if src_rpr is not None:
+            new_r.append(deepcopy(src_rpr))
+    t = OxmlElement("w:t")
+    t.text = text
+    t.set(qn("xml:space"), "preserve")
+    new_r.append(t)
+    new_p.append(new_r)
+    src_p.addnext(new_p)
+    return Paragraph(new_p, paragraph._parent)
+
+
+def apply_patch_to_doc(paras, seg_by_id, edits):
+    """Apply edits against the paragraph list snapshot taken by make_segments.
+
+    Indexing the snapshot (instead of doc.paragraphs, which re-walks the
+    XML per access) also keeps seg.para_idx valid after insert_after edits:
+    the live document gains paragraphs but the snapshot's ordering doesn't
+    shift. Inserted paragraphs are appended at the end of the snapshot.
+    """
+    applied = 0
+    replaces = {}  # para_idx -> [(seg, edit)] in patch order
+    for edit in edits:
+        seg = seg_by_id.get(edit["id"])
+        if seg is None:
+            print(f"skipping unknown segment {edit['id']!r}", file=sys.stderr)
+            continue
+        op = edit.get("op", "replace_text")
+        if op == "replace_text":
+            replaces.setdefault(seg.para_idx, []).append((seg, edit))
+        elif op == "insert_after":
+            paras.append(insert_paragraph_after(paras[seg.para_idx], edit["new_text"]))
+            applied += 1
+        else:
+            print(f"skipping unknown op {op!r}", file=sys.stderr)
+    for para_idx, batch in replaces.items():
+        p = paras[para_idx]
+        if len(batch) > 1:
+            applied += _apply_replacement_batch(p, batch[0][0], [e for _, e in batch])
+            continue
+        # seg.text is the join already done at extraction; it is only
+        # valid until the paragraph's first edit lands
+        cached = batch[0][0].text
+        for seg, edit in batch:
+            if replace_first_occurrence_in_runs(
+                p, edit["old_excerpt"], edit["new_text"], concatenated=cached
+            ):
+                applied += 1
+            else:
+                print(f"excerpt not found in {seg.id}", file=sys.stderr)
+            cached = None
+    return applied
+
+
+def save_fast(doc, path):
+    """doc.save at deflate level 1.
+
+    Re-zipping the package is CPU-bound on deflate, and python-docx exposes
+    no compresslevel knob, so swap the ZipFile its package writer uses for
+    the duration of the save. Level 1 cuts save CPU roughly 3-4x over the
+    default 6 for a marginally larger file — the right trade for an
+    edit-and-save pipeline.
+    """
+    from docx.opc import phys_pkg
+
+    class _FastZipFile(ZipFile):
+        def __init__(self, *args, **kwargs):
+            kwargs.setdefault("compresslevel", 1)
+            super().__init__(*args, **kwargs)
+
+    original = phys_pkg.ZipFile
+    phys_pkg.ZipFile = _FastZipFile
+    try:
+        doc.save(str(path))
+    finally:
+        phys_pkg.ZipFile = original
+
+
+def write_id_map(segments, out_path=OUT_MAP_JSON):
+    """Stream the segment map straight to disk.
+
+    Serializing one segment at a time avoids materializing a parallel list
+    of dicts duplicating every paragraph's text, so peak memory stays at a
+    single segment regardless of document size.
+    """
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write('{"source": %s, "segments": [' % json.dumps(DOC_PATH.name))
+        sep = "\n"
+        for seg in segments:
+            f.write(sep)
+            json.dump(
+                {name: getattr(seg, name) for name in _SEGMENT_FIELDS},
+                f,
+                ensure_ascii=False,
+            )
+            sep = ",\n"
+        f.write("\n]}\n")
+
+
+def main():
+    with open(DOC_PATH, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        doc = Document(mm)
+    segments, paras, seg_by_id = make_segments(doc)
+    write_id_map(segments)
+    if len(sys.argv) > 1:
+        edits = json.loads(Path(sys.argv[1]).read_text(encoding="utf-8"))
+        applied = apply_patch_to_doc(paras, seg_by_id, edits)
+        save_fast(doc, OUT_PATCHED)
+        print(f"applied {applied}/{len(edits)} edits -> {OUT_PATCHED}")
+
+
+if __name__ == "__main__":
+    main()